@@ -11,15 +11,24 @@ Created on Jun 12, 2018
 """
 import os
 import logging
-import traceback
+import weakref
+from functools import lru_cache
+from operator import itemgetter
 from typing import Dict as DictType
 from typing import List as ListType
 from typing import Tuple as TupleType
-from typing import Any, ClassVar, Generic, Type, TypeVar, Optional, Union
-from collections.abc import MutableMapping
-from random import getrandbits
-from pprint import pformat
-from base64 import b64encode, b64decode
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Generic,
+    Sequence,
+    Type,
+    TypeVar,
+    Optional,
+    Union,
+)
+from binascii import a2b_base64, b2a_base64
 from datetime import date, time, datetime
 from decimal import Decimal
 from uuid import UUID
@@ -43,18 +52,47 @@ T = TypeVar("T")
 M = TypeVar("M", bound="Model")
 ScopeType = DictType[Union[str, bytes], Any]
 StateType = DictType[str, Any]
+FieldSpec = TupleType[str, Member, Optional[Callable], Optional[Callable], int]
 logger = logging.getLogger("atomdb")
 
+#: Marker for values that are not present
+_MISSING = object()
+
+#: Types which are returned as is when flattened or unflattened
+SCALAR_TYPES = frozenset((int, float, str, bool, type(None)))
+
+#: Types which are flattened as a dict. Custom mapping types can be added here
+MAPPING_TYPES = (dict,)
+
 
 def find_subclasses(cls: Type[T]) -> ListType[Type[T]]:
-    """Finds subclasses of the given class"""
+    """Finds subclasses of the given class in depth first order"""
     classes = []
-    for subclass in cls.__subclasses__():
+    seen = set()
+    stack = type.__subclasses__(cls)[::-1]
+    while stack:
+        subclass = stack.pop()
+        if subclass in seen:
+            continue  # Reached through multiple bases
+        seen.add(subclass)
         classes.append(subclass)
-        classes.extend(find_subclasses(subclass))
+        stack.extend(type.__subclasses__(subclass)[::-1])
     return classes
 
 
+def generate_ref() -> bytes:
+    """Generate a random 120 bit hex reference used to handle cyclical
+    serialization and deserialization.
+
+    """
+    return os.urandom(15).hex().encode()
+
+
+def generate_str_ref() -> str:
+    """Generate a random 120 bit hex reference as a str"""
+    return os.urandom(15).hex()
+
+
 def is_db_field(m: Member) -> bool:
     """Check if the member should be saved into the database.  Any member that
     does not start with an underscore and is not tagged with `store=False`
@@ -78,38 +116,93 @@ def is_db_field(m: Member) -> bool:
     return default
 
 
+def generate_getstate(cls: Type["Model"]) -> Callable[..., StateType]:
+    """Generate a function which returns the state of a model with the
+    flatten call of every field written out instead of looping over the
+    fields and their metadata.
+
+    Parameters
+    ----------
+    cls: Type[Model]
+        The model class to generate the function for.
+
+    Returns
+    -------
+    getstate: Callable
+        A function accepting the model and the scope which returns the state.
+
+    """
+    # The model name is bound when the function is created but the serializer
+    # is looked up on each call since it may be reassigned later
+    namespace: DictType[str, Any] = {}
+    model = f'"__model__": {cls.__model__!r}, "__ref__": ref'
+    items = []
+    for i, (f, m, flatten, unflatten, order) in enumerate(cls.__field_specs__):
+        namespace[f"get_{i}"] = m.do_getattr
+        if flatten is None:
+            items.append(f"{f!r}: default_flatten(get_{i}(self), scope)")
+        else:
+            namespace[f"flatten_{i}"] = flatten
+            items.append(f"{f!r}: flatten_{i}(get_{i}(self), scope)")
+    fields = "".join(f", {item}" for item in items)
+
+    # The _id is only included when set. Each case builds the state with a
+    # single dict literal using the same key order.
+    lines = [
+        "def getstate(self, scope):",
+        "    ref = self.__ref__",
+        "    scope[ref] = self",
+        "    default_flatten = self.serializer.flatten",
+        "    _id = self._id",
+        "    if _id is None:",
+        f"        return {{{model}{fields}}}",
+        f'    return {{{model}, "_id": _id{fields}}}',
+    ]
+    exec("\n".join(lines), namespace)
+    return namespace["getstate"]
+
+
 class ModelSerializer(Atom):
     """Handles serializing and deserializing of Model subclasses. It
     will automatically save and restore references where present.
 
     """
 
-    #: Hold one instance per subclass for easy reuse
-    _instances: ClassVar[DictType[Type["ModelSerializer"], "ModelSerializer"]] = {}
-
     #: Store all registered models
     registry = Dict()
 
     #: Mapping of type name to coercer function
     coercers = Dict(
         default={
-            "datetime.date": lambda s: date(**s),
-            "datetime.datetime": lambda s: datetime(**s),
-            "datetime.time": lambda s: time(**s),
-            "bytes": lambda s: b64decode(s["bytes"]),
+            "datetime.date": lambda s: date(s["year"], s["month"], s["day"]),
+            "datetime.datetime": lambda s: datetime(
+                s["year"],
+                s["month"],
+                s["day"],
+                s["hour"],
+                s["minute"],
+                s["second"],
+                s["microsecond"],
+            ),
+            "datetime.time": lambda s: time(
+                s["hour"], s["minute"], s["second"], s["microsecond"]
+            ),
+            "bytes": lambda s: a2b_base64(s["bytes"]),
             "decimal": lambda s: Decimal(s["value"]),
             "uuid": lambda s: UUID(s["id"]),
         }
     )
 
     @classmethod
+    @lru_cache(maxsize=None)
     def instance(cls: Type["ModelSerializer"]) -> "ModelSerializer":
-        if cls not in ModelSerializer._instances:
-            ModelSerializer._instances[cls] = cls()
-        return ModelSerializer._instances[cls]
+        """Hold one instance per subclass for easy reuse"""
+        return cls()
 
     def flatten(self, v: Any, scope: Optional[ScopeType] = None) -> Any:
-        """Convert Model objects to a dict
+        """Convert Model objects to a dict. Lists, tuples, sets, and dicts
+        are walked using a stack instead of recursion and every other value
+        is converted using `flatten_value`.
 
         Parameters
         ----------
@@ -124,16 +217,56 @@ class ModelSerializer(Atom):
             The flattened object
 
         """
-        flatten = self.flatten
-        scope = scope or {}
+        if type(v) in SCALAR_TYPES:
+            return v
+        if scope is None:
+            scope = {}
+        flatten_value = self.flatten_value
+        if not isinstance(v, (list, tuple, set)) and not isinstance(v, MAPPING_TYPES):
+            return flatten_value(v, scope)
+
+        # Items are popped in the same order as a depth first recursive walk
+        # so circular references are resolved in the same order by unflatten
+        result: ListType[Any] = [v]
+        stack: ListType[TupleType[Any, Any, Any]] = [(result, 0, v)]
+        while stack:
+            parent, key, item = stack.pop()
+            if type(item) in SCALAR_TYPES:
+                parent[key] = item
+            elif isinstance(item, (list, tuple, set)):
+                items = parent[key] = list(item)
+                stack.extend(
+                    (items, i, it) for i, it in reversed(list(enumerate(items)))
+                )
+            elif isinstance(item, MAPPING_TYPES):
+                entries = parent[key] = dict(item)
+                stack.extend(
+                    (entries, k, it) for k, it in reversed(list(entries.items()))
+                )
+            else:
+                parent[key] = flatten_value(item, scope)
+        return result[0]
+
+    def flatten_value(self, v: Any, scope: ScopeType) -> Any:
+        """Convert a value which is not a list, tuple, set, or dict. Subclasses
+        can override this to convert other types.
 
+        Parameters
+        ----------
+        v: Object
+            The object to flatten
+        scope: Dict
+            The scope of references available for circular lookups
+
+        Returns
+        -------
+        result: Object
+            The flattened object
+
+        """
         # Handle circular reference
         if isinstance(v, Model):
             return v.serializer.flatten_object(v, scope)
-        elif isinstance(v, (list, tuple, set)):
-            return [flatten(item, scope) for item in v]
-        elif isinstance(v, (dict, MutableMapping)):
-            return {k: flatten(item, scope) for k, item in v.items()}
         # TODO: Handle other object types
         return v
 
@@ -171,31 +304,60 @@ class ModelSerializer(Atom):
             The unflattened object
 
         """
-        unflatten = self.unflatten
-        scope = scope or {}
-        if isinstance(v, dict):
-            # Circular reference
-            ref = v.get("__ref__")
-            if ref is not None and ref in scope:
-                return scope[ref]
-
-            # Create the object
-            name = v.get("__model__")
-            if name is not None:
-                cls = self.registry[name]
-                return await cls.serializer.unflatten_object(cls, v, scope)
-
-            # Convert py types
-            py_type = v.pop("__py__", None)
-            if py_type:
-                coercer = self.coercers.get(py_type)
-                if coercer:
-                    return coercer(v)
-
-            return {k: await unflatten(i, scope) for k, i in v.items()}
-        elif isinstance(v, (list, tuple)):
-            return [await unflatten(item, scope) for item in v]
-        return v
+        if type(v) in SCALAR_TYPES or not isinstance(v, (dict, list, tuple)):
+            return v
+        if scope is None:
+            scope = {}
+
+        # Walk the items using a stack in the same order they were flattened.
+        # Only models need to be awaited.
+        result: ListType[Any] = [v]
+        stack: ListType[TupleType[Any, Any, Any]] = [(result, 0, v)]
+        while stack:
+            parent, key, item = stack.pop()
+            if type(item) in SCALAR_TYPES:
+                parent[key] = item
+            elif isinstance(item, dict):
+                # Circular reference
+                ref = item.get("__ref__")
+                if ref is not None:
+                    obj = scope.get(ref)
+                    if obj is not None:
+                        parent[key] = obj
+                        continue
+
+                # Create the object
+                name = item.get("__model__")
+                if name is not None:
+                    cls = self.registry[name]
+                    parent[key] = await cls.serializer.unflatten_object(
+                        cls, item, scope
+                    )
+                    continue
+
+                # Convert py types. The input is not modified so the same
+                # flattened state can be restored more than once.
+                py_type = item.get("__py__")
+                if py_type:
+                    coercer = self.coercers.get(py_type)
+                    if coercer:
+                        parent[key] = coercer(item)
+                        continue
+
+                entries = parent[key] = dict(item)
+                if "__py__" in entries:
+                    del entries["__py__"]
+                stack.extend(
+                    (entries, k, it) for k, it in reversed(list(entries.items()))
+                )
+            elif isinstance(item, (list, tuple)):
+                items = parent[key] = list(item)
+                stack.extend(
+                    (items, i, it) for i, it in reversed(list(enumerate(items)))
+                )
+            else:
+                parent[key] = item
+        return result[0]
 
     async def unflatten_object(
         self, cls: Type["Model"], state: StateType, scope: ScopeType
@@ -295,14 +457,14 @@ class ModelManager(Atom):
 
     """
 
-    #: Stores instances of each class so we can easily reuse them if desired
-    _instances: ClassVar[DictType[Type["ModelManager"], "ModelManager"]] = {}
-
     @classmethod
+    @lru_cache(maxsize=None)
     def instance(cls) -> "ModelManager":
-        if cls not in ModelManager._instances:
-            ModelManager._instances[cls] = cls()
-        return ModelManager._instances[cls]
+        """Stores instances of each class so we can easily reuse them if
+        desired
+
+        """
+        return cls()
 
     #: Used to access the database
     database = Value()
@@ -318,6 +480,35 @@ class ModelManager(Atom):
         raise NotImplementedError
 
 
+#: Every model class in the order they were created. Classes are held weakly
+#: so models which are no longer used are not kept alive.
+_MODEL_REGISTRY: "weakref.WeakKeyDictionary[Type[Model], None]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def registered_models(base: Type[M]) -> DictType[str, Type[M]]:
+    """Get the models which subclass the given base keyed by their model name
+    in the order they were created. The base itself is not included.
+
+    Parameters
+    ----------
+    base: Type[Model]
+        The model class to find the subclasses of.
+
+    Returns
+    -------
+    models: Dict[str, Type[Model]]
+        The models keyed by their __model__ name.
+
+    """
+    return {
+        m.__model__: m
+        for m in list(_MODEL_REGISTRY)
+        if m is not base and issubclass(m, base)
+    }
+
+
 class ModelMeta(AtomMeta):
     def __new__(meta, name, bases, dct):
         cls = AtomMeta.__new__(meta, name, bases, dct)
@@ -325,9 +516,11 @@ class ModelMeta(AtomMeta):
         # Fields that are saved in the db. By default it uses all atom members
         # that don't start with an underscore and are not taged with store.
         if "__fields__" not in dct:
-            cls.__fields__ = [
+            cls.__fields__ = tuple(
                 name for name, m in cls.members().items() if is_db_field(m)
-            ]
+            )
+        else:
+            cls.__fields__ = tuple(dct["__fields__"])
 
         # Model name used so the serializer knows what class to recreate
         # when restoring
@@ -336,6 +529,35 @@ class ModelMeta(AtomMeta):
 
         return cls
 
+    def __init__(cls, name, bases, dct):
+        super().__init__(name, bases, dct)
+
+        # Cache each member along with its flatten, unflatten, and
+        # setstate_order tags so they are not looked up on every object that
+        # is serialized. This is done here instead of in __new__ so the
+        # fields and members are final when a subclass meta modifies them.
+        specs = {}
+        ordered = False
+        for f, m in cls.members().items():
+            meta = m.metadata or {}
+            if "setstate_order" in meta:
+                ordered = True
+            specs[f] = (
+                f,
+                m,
+                meta.get("flatten"),
+                meta.get("unflatten"),
+                meta.get("setstate_order", 1000),
+            )
+        cls.__field_specs__ = tuple(specs[f] for f in cls.__fields__)
+        # Only sort when needed, otherwise members restore in definition order
+        restore_specs = specs.values()
+        if ordered:
+            restore_specs = sorted(restore_specs, key=itemgetter(4))
+        cls.__restore_specs__ = tuple(restore_specs)
+        cls.__flatten_state__ = generate_getstate(cls)
+        _MODEL_REGISTRY[cls] = None
+
 
 class Model(Atom, metaclass=ModelMeta):
     """An atom model that can be serialized and deserialized to and from
@@ -348,8 +570,17 @@ class Model(Atom, metaclass=ModelMeta):
     # --------------------------------------------------------------------------
     __slots__ = "__weakref__"
 
-    #: List of database field member names
-    __fields__: ClassVar[ListType[str]]
+    #: Tuple of database field member names
+    __fields__: ClassVar[TupleType[str, ...]]
+
+    #: Each field as (name, member, flatten, unflatten, setstate_order)
+    __field_specs__: ClassVar[TupleType[FieldSpec, ...]]
+
+    #: Serialization hooks of every member sorted by the setstate_order
+    __restore_specs__: ClassVar[TupleType[FieldSpec, ...]]
+
+    #: Function generated for each class used by __getstate__
+    __flatten_state__: ClassVar[Callable[..., StateType]]
 
     #: Table name used when saving into the database
     __model__: ClassVar[str]
@@ -365,7 +596,7 @@ class Model(Atom, metaclass=ModelMeta):
     _id = Bytes()  # type: Any
 
     #: A unique ID used to handle cyclical serialization and deserialization
-    __ref__ = Bytes(factory=lambda: b"%0x" % getrandbits(30 * 4))  # type: Any
+    __ref__ = Bytes(factory=generate_ref)  # type: Any
 
     #: Flag to indicate if this model has been restored or saved
     __restored__ = Bool().tag(store=False)
@@ -384,29 +615,24 @@ class Model(Atom, metaclass=ModelMeta):
     serializer: ModelSerializer = ModelSerializer.instance()
 
     def __getstate__(self, scope: Optional[ScopeType] = None) -> StateType:
-        default_flatten = self.serializer.flatten
-
-        scope = scope or {}
-
-        # ID for circular references
-        ref = self.__ref__
-        scope[ref] = self
+        """Get the flattened state of this object using the function that
+        was generated for the class. The __ref__ is added to the scope for
+        circular references.
 
-        state = {
-            "__model__": self.__model__,
-            "__ref__": ref,
-        }
-        if self._id is not None:
-            state["_id"] = self._id
+        Parameters
+        ----------
+        scope: Dict or None
+            A namespace used to resolve any possible circular references.
 
-        members = self.members()
-        for f in self.__fields__:
-            m = members[f]
-            meta = m.metadata or {}
-            flatten = meta.get("flatten", default_flatten)
-            state[f] = flatten(getattr(self, f), scope)
+        Returns
+        -------
+        state: Dict
+            The state of the object.
 
-        return state
+        """
+        if scope is None:
+            scope = {}
+        return self.__flatten_state__(scope)
 
     async def __restorestate__(
         self, state: StateType, scope: Optional[ScopeType] = None
@@ -433,50 +659,54 @@ class Model(Atom, metaclass=ModelMeta):
             raise ValueError(
                 f"Trying to use {name} state for " f"{self.__model__} object"
             )
-        scope = scope or {}
+        if scope is None:
+            scope = {}
         ref = state.get("__ref__")
         if ref is not None:
             scope[ref] = self
-        members = self.members()
-
-        # Order the keys by the members 'setstate_order' if given
-        valid_keys = []
         default_unflatten = self.serializer.unflatten
-        for k in state.keys():
-            m = members.get(k)
-            if m is not None:
-                meta = m.metadata or {}
-                order = meta.get("setstate_order", 1000)
-
-                # Allow  tagging a custom unflatten fn
-                unflatten = meta.get("unflatten", default_unflatten)
-
-                valid_keys.append((order, k, unflatten))
-        valid_keys.sort(key=lambda it: it[0])
 
         # Save initial database state
         # self.__state__ = dict(state)
 
         on_error = self.__on_error__
 
-        for order, k, unflatten in valid_keys:
+        # The specs are already ordered by the members 'setstate_order'
+        get_state = state.get
+        for k, m, flatten, unflatten, order in self.__restore_specs__:
+            v = get_state(k, _MISSING)
+            if v is _MISSING:
+                continue
             try:
-                v = state[k]
-                obj = await unflatten(v, scope)
-                setattr(self, k, obj)
+                # Allow tagging a custom unflatten fn
+                obj = await (unflatten or default_unflatten)(v, scope)
+                m.do_setattr(self, obj)
             except Exception as e:
                 if on_error == "raise":
                     raise
-                elif on_error == "log":
+                elif on_error == "log" and logger.isEnabledFor(logging.DEBUG):
+                    # Formatting the scope and state can be expensive so only
+                    # do it when the message will actually be logged
+                    import traceback
+                    from pprint import pformat
+
                     exc = traceback.format_exc()
                     logger.debug(
-                        f"Error loading state:"
-                        f"{self.__model__}.{k} = {pformat(obj)}:"
-                        f"\nSelf: {ref}: {scope.get(ref)}"
-                        f"\nValue: {pformat(v)}"
-                        f"\nScope: {pformat(scope)}"
-                        f"\nState: {pformat(state)}"
-                        f"\n{exc}"
+                        "Error loading state:%s.%s = %s:"
+                        "\nSelf: %s: %s"
+                        "\nValue: %s"
+                        "\nScope: %s"
+                        "\nState: %s"
+                        "\n%s",
+                        self.__model__,
+                        k,
+                        pformat(obj),
+                        ref,
+                        scope.get(ref),
+                        pformat(v),
+                        pformat(scope),
+                        pformat(state),
+                        exc,
                     )
 
         # Update restored state
@@ -496,6 +726,29 @@ class Model(Atom, metaclass=ModelMeta):
         await obj.__restorestate__(state)
         return obj
 
+    @classmethod
+    async def restore_many(
+        cls: Type[M], states: Sequence[StateType], **kwargs: Any
+    ) -> ListType[M]:
+        """Restore a list of objects from the database states. Subclasses
+        can override this to restore rows in bulk.
+
+        Parameters
+        ----------
+        states: List[Dict]
+            The state of each object to restore
+        kwargs:
+            Arguments passed to restore
+
+        Returns
+        -------
+        objects: List[Model]
+            The restored objects in the same order as the states.
+
+        """
+        restore = cls.restore
+        return [await restore(state, **kwargs) for state in states]
+
     async def load(self):
         """Alias to load this object from the database"""
         raise NotImplementedError
@@ -509,12 +762,68 @@ class Model(Atom, metaclass=ModelMeta):
         raise NotImplementedError
 
 
+def flatten_date(v: date) -> DictType[str, Any]:
+    return {"__py__": "datetime.date", "year": v.year, "month": v.month, "day": v.day}
+
+
+def flatten_datetime(v: datetime) -> DictType[str, Any]:
+    return {
+        "__py__": "datetime.datetime",
+        "year": v.year,
+        "month": v.month,
+        "day": v.day,
+        "hour": v.hour,
+        "minute": v.minute,
+        "second": v.second,
+        "microsecond": v.microsecond,
+        # TODO: Timezones
+    }
+
+
+def flatten_time(v: time) -> DictType[str, Any]:
+    return {
+        "__py__": "datetime.time",
+        "hour": v.hour,
+        "minute": v.minute,
+        "second": v.second,
+        "microsecond": v.microsecond,
+        # TODO: Timezones
+    }
+
+
+def flatten_bytes(v: bytes) -> DictType[str, Any]:
+    return {"__py__": "bytes", "bytes": b2a_base64(v, newline=False).decode("ascii")}
+
+
+def flatten_decimal(v: Decimal) -> DictType[str, Any]:
+    return {"__py__": "decimal", "value": str(v)}
+
+
+def flatten_uuid(v: UUID) -> DictType[str, Any]:
+    return {"__py__": "uuid", "id": str(v)}
+
+
+#: Mapping of the exact type to the function used to flatten it with json
+JSON_FLATTENERS: DictType[type, Callable[[Any], DictType[str, Any]]] = {
+    date: flatten_date,
+    datetime: flatten_datetime,
+    time: flatten_time,
+    bytes: flatten_bytes,
+    Decimal: flatten_decimal,
+    UUID: flatten_uuid,
+}
+
+
 class JSONSerializer(ModelSerializer):
-    def flatten(self, v: Any, scope: Optional[ScopeType] = None):
+    def flatten_value(self, v: Any, scope: ScopeType):
         """Flatten date, datetime, time, decimal, and bytes as a dict with
         a __py__ field and arguments to reconstruct it. Also see the coercers
 
         """
+        # Lookup by the exact type first. Subclasses are handled below.
+        flatten = JSON_FLATTENERS.get(type(v))
+        if flatten is not None:
+            return flatten(v)
         if isinstance(v, (date, datetime, time)):
             # This is inefficient space wise but still allows queries
             s: DictType[str, Any] = {
@@ -534,20 +843,19 @@ class JSONSerializer(ModelSerializer):
                 )
             return s
         if isinstance(v, bytes):
-            return {"__py__": "bytes", "bytes": b64encode(v).decode()}
+            return flatten_bytes(v)
         if isinstance(v, Decimal):
-            return {"__py__": "decimal", "value": str(v)}
+            return flatten_decimal(v)
         if isinstance(v, UUID):
-            return {"__py__": "uuid", "id": str(v)}
-        return super().flatten(v, scope)
+            return flatten_uuid(v)
+        return super().flatten_value(v, scope)
 
     def flatten_object(self, obj: Model, scope: ScopeType) -> DictType[str, Any]:
         """Flatten to just json but add in keys to know how to restore it."""
         ref = obj.__ref__
-        if ref in scope:
+        if scope.get(ref) is not None:
             return {"__ref__": ref, "__model__": obj.__model__}
-        else:
-            scope[ref] = obj
+        scope[ref] = obj
         state = obj.__getstate__(scope)
         _id = state.get("_id")
         if _id:
@@ -559,7 +867,7 @@ class JSONSerializer(ModelSerializer):
         return state
 
     def _default_registry(self) -> DictType[str, Type[Model]]:
-        return {m.__model__: m for m in find_subclasses(JSONModel)}
+        return registered_models(JSONModel)
 
 
 class JSONModel(Model):
@@ -572,5 +880,5 @@ class JSONModel(Model):
 
     #: JSON cannot encode bytes
     _id = Str()
-    __ref__ = Str(factory=lambda: (b"%0x" % getrandbits(30 * 4)).decode())
+    __ref__ = Str(factory=generate_str_ref)
     __restored__ = set_default(True)  # type: ignore
@@ -12,7 +12,13 @@ Created on Jun 12, 2018
 import weakref
 import bson
 from atom.api import Atom, Instance, Value, Dict, Typed
-from .base import ModelManager, ModelSerializer, Model, find_subclasses, JSONSerializer
+from .base import (
+    ModelManager,
+    ModelSerializer,
+    Model,
+    JSONSerializer,
+    registered_models,
+)
 
 
 class NoSQLModelSerializer(ModelSerializer):
@@ -45,7 +51,7 @@ class NoSQLModelSerializer(ModelSerializer):
 
     def flatten_object(self, obj, scope):
         ref = obj.__ref__
-        if ref in scope:
+        if scope.get(ref) is not None:
             return {"__ref__": ref, "__model__": obj.__model__}
         scope[ref] = obj
         state = obj.__getstate__(scope)
@@ -57,7 +63,7 @@ class NoSQLModelSerializer(ModelSerializer):
     def _default_registry(self):
         """Add all nosql and json models to the registry"""
         registry = JSONSerializer.instance().registry.copy()
-        registry.update({m.__model__: m for m in find_subclasses(NoSQLModel)})
+        registry.update(registered_models(NoSQLModel))
         return registry
 
 
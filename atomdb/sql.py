@@ -15,8 +15,12 @@ import datetime
 import weakref
 import asyncio
 import sqlalchemy as sa
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from decimal import Decimal
-from functools import wraps
+from functools import lru_cache, wraps
+from operator import itemgetter
 from typing import Dict as DictType
 from typing import List as ListType
 from typing import Tuple as TupleType
@@ -24,10 +28,10 @@ from typing import Set as SetType
 from typing import Callable as CallableType
 from typing import (
     Any,
+    AsyncGenerator,
     ClassVar,
     Type,
     Optional,
-    Iterator,
     Union,
     Sequence,
     Generic,
@@ -48,9 +52,7 @@ from atom.api import (
     Str,
     ForwardInstance,
     ForwardSubclass,
-    Value,
     Bool,
-    List,
 )
 from sqlalchemy.engine import ddl, strategies
 from sqlalchemy.sql import schema
@@ -86,8 +88,38 @@ COLUMN_KWARGS = (
     "system",
     "comment",
 )
+COLUMN_KWARGS_SET = frozenset(COLUMN_KWARGS)
 FK_TYPES = (api.Instance, api.Typed, api.ForwardInstance, api.ForwardTyped)
 
+# Column types of python types that can be looked up directly by type. Other
+# types are resolved using issubclass checks.
+PY_TYPE_COLUMNS = {
+    str: sa.String,
+    int: sa.Integer,
+    float: sa.Float,
+    dict: sa.JSON,
+    datetime.datetime: sa.DateTime,
+    datetime.date: sa.Date,
+    datetime.time: sa.Time,
+    datetime.timedelta: sa.Interval,
+    bytes: sa.LargeBinary,
+    bytearray: sa.LargeBinary,
+    Decimal: sa.Numeric,
+}
+
+# Column types of atom members that can be looked up directly by member type.
+# Other members are resolved using isinstance checks.
+MEMBER_COLUMNS: DictType[Type[Member], CallableType[..., TypeEngine]] = {
+    api.Str: sa.String,
+    api.Bool: lambda **kwargs: sa.Boolean(),
+    api.Int: lambda **kwargs: sa.Integer(),
+    api.Float: lambda **kwargs: sa.Float(),
+    api.Range: lambda **kwargs: sa.Integer(),
+    api.FloatRange: lambda **kwargs: sa.Float(),
+    api.Bytes: sa.LargeBinary,
+    api.Dict: sa.JSON,
+}
+
 # ops that can be used with django-style queries
 QUERY_OPS = {
     "eq": "__eq__",
@@ -117,6 +149,31 @@ QUERY_OPS = {
     "startswith": "startswith",
 }
 
+# Unbound column methods of each op so filters do not need to use getattr
+QUERY_OP_FUNCS = {k: getattr(sa.Column, v) for k, v in QUERY_OPS.items()}
+
+#: Order filter terms are added to the where clause so the most selective
+#: terms come first. Any op not listed is placed after the ranges.
+QUERY_OP_ORDER = {
+    "eq": 0,
+    "is": 0,
+    "in": 1,
+    "gt": 2,
+    "gte": 2,
+    "ge": 2,
+    "lt": 2,
+    "le": 2,
+    "lte": 2,
+    "contains": 4,
+    "endswith": 4,
+    "ilike": 4,
+    "like": 4,
+    "match": 4,
+    "notilike": 4,
+    "notlike": 4,
+    "startswith": 4,
+}
+
 # Fields supported on the django style Meta class of a model
 VALID_META_FIELDS = (
     "db_name",
@@ -143,17 +200,47 @@ log = logging.getLogger("atomdb.sql")
 
 QueryType = Union[str, sa.sql.expression.Executable]
 T = TypeVar("T", bound="SQLModel")
+R = TypeVar("R")
+
+#: The engine and connection of the active session, if any
+_session: ContextVar = ContextVar("atomdb_session", default=None)
+
+
+def _session_connection(engine: Any) -> Any:
+    """Get the connection of the active session if it uses the given engine.
+
+    Returns
+    -------
+    connection: Database connection or None
+        The connection of the session or None if no session for the engine
+        is active.
+
+    """
+    session = _session.get()
+    if session is not None and session[0] is engine:
+        return session[1]
+    return None
 
 
-def find_sql_models() -> Iterator[Type["SQLModel"]]:
+#: How a member is restored from a database row
+RESTORE_FIELD, RESTORE_FK, RESTORE_JSON, RESTORE_M2M, RESTORE_RELATION = range(5)
+
+#: Member name, column name, column label, how it is restored, the related
+#: model or through factory, and the label of the related model's pk
+RestoreSpec = TupleType[str, str, str, int, Any, str]
+
+
+@lru_cache(maxsize=None)
+def find_sql_models() -> TupleType[Type["SQLModel"], ...]:
     """Finds all non-abstract imported SQLModels by looking up subclasses
-    of the SQLModel.
+    of the SQLModel. The result is cached until a new SQLModel is created.
 
-    Yields
-    ------
-    cls: SQLModel
+    Returns
+    -------
+    models: Tuple[SQLModel, ...]
 
     """
+    models = []
     for model in find_subclasses(SQLModel):
         # Get model Meta class
         meta = getattr(model, "Meta", None)
@@ -161,7 +248,8 @@ def find_sql_models() -> Iterator[Type["SQLModel"]]:
             # If this is marked as abstract ignore it
             if getattr(meta, "abstract", False):
                 continue
-        yield model
+        models.append(model)
+    return tuple(models)
 
 
 class Relation(ContainerList):
@@ -198,7 +286,10 @@ def py_type_to_sql_column(
     else:
         cls = types
 
-    if issubclass(cls, JSONModel):
+    column_type = PY_TYPE_COLUMNS.get(cls)
+    if column_type is not None:
+        return column_type(**kwargs)
+    elif issubclass(cls, JSONModel):
         return sa.JSON(**kwargs)
     elif issubclass(cls, SQLModel):
         name = f"{cls.__model__}.{cls.__pk__}"
@@ -236,9 +327,23 @@ def py_type_to_sql_column(
     )
 
 
+def _clear_caches():
+    """Clear the cached lookups of the models. This is done when a model is
+    created so the caches do not return stale results or keep references to
+    models which are no longer used.
+
+    """
+    find_sql_models.cache_clear()
+    resolve_member_types.cache_clear()
+    _resolve_member_column.cache_clear()
+    _parse_filter_key.cache_clear()
+    _restore_plan.cache_clear()
+
+
+@lru_cache(maxsize=None)
 def resolve_member_types(member: Member) -> Optional[TupleType[type, ...]]:
     """Determine the type specified on a member to determine ForeignKey
-    relations.
+    relations. The result is cached for each member.
 
     Parameters
     ----------
@@ -259,6 +364,11 @@ def resolve_member_types(member: Member) -> Optional[TupleType[type, ...]]:
     return (types,)
 
 
+def _invalid_field(field: str, model: Any) -> ValueError:
+    """Create the error raised when a field cannot be resolved"""
+    return ValueError(f"Invalid field {field} on {model}")
+
+
 def resolve_member_column(
     model: Type["SQLModel"], field: str, related_clauses: Optional[ListType[str]] = None
 ) -> sa.Column:
@@ -270,6 +380,8 @@ def resolve_member_column(
         The model to lookup
     field: String
         The field name
+    related_clauses: List[str] or None
+        If given any related clauses needed to lookup the field are added
 
     Returns
     -------
@@ -279,15 +391,31 @@ def resolve_member_column(
 
     """
     if model is None or not field:
-        raise ValueError("Invalid field %s on %s" % (field, model))
+        raise _invalid_field(field, model)
+    col, clauses = _resolve_member_column(model, field)
+    if related_clauses is not None:
+        for clause in clauses:
+            if clause not in related_clauses:
+                related_clauses.append(clause)
+    return col
+
+
+@lru_cache(maxsize=None)
+def _resolve_member_column(
+    model: Type["SQLModel"], field: str
+) -> TupleType[sa.Column, TupleType[str, ...]]:
+    """Lookup the column for the given model and field along with the
+    related clauses required to join it. The result is cached so the lookup
+    path is only walked once for each model and field.
+
+    """
+    clauses = []
 
     # Walk the relations
     if "__" in field:
         path = field
         *related_parts, field = field.split("__")
-        clause = "__".join(related_parts)
-        if related_clauses is not None and clause not in related_clauses:
-            related_clauses.append(clause)
+        clauses.append("__".join(related_parts))
 
         # Follow the FK lookups
         # Rename so the original lookup path is retained if an error occurs
@@ -295,34 +423,55 @@ def resolve_member_column(
         for part in related_parts:
             m = rel_model.members().get(part)
             if m is None:
-                raise ValueError("Invalid field %s on %s" % (path, model))
+                raise _invalid_field(path, model)
             rel_model_types = resolve_member_types(m)
             if rel_model_types is None:
-                raise ValueError("Invalid field %s on %s" % (path, model))
+                raise _invalid_field(path, model)
             rel_model = rel_model_types[0]
         model = rel_model
 
     # Lookup the member
     m = model.members().get(field)
     if m is not None:
-        if m.metadata:
-            # If the field has a different name assigned use that
-            field = m.metadata.get("name", field)
+        # If the field has a different name assigned use that
+        field = model.__column_names__[field]
         if isinstance(m, Relation):
             # Support looking up columns through a relation by the pk
             model = m.to  # type: ignore
 
             # Add the through table to the related clauses if needed
-            if related_clauses is not None and field not in related_clauses:
-                related_clauses.append(field)
+            if field not in clauses:
+                clauses.append(field)
 
             field = model.__pk__
 
     # Finally get the column from the table
     col = model.objects.table.columns.get(field)
     if col is None:
-        raise ValueError("Invalid field %s on %s" % (field, model))
-    return col
+        raise _invalid_field(field, model)
+    return (col, tuple(clauses))
+
+
+@lru_cache(maxsize=1024)
+def _parse_filter_key(
+    model: Type["SQLModel"], key: str
+) -> TupleType[str, sa.Column, TupleType[str, ...]]:
+    """Split a django style filter key into the query op and the field then
+    lookup the column and the related clauses required to join it. The
+    result is cached since the same filters are used repeatedly.
+
+    """
+    op = "eq"
+    field = key
+    if "__" in key:
+        *parts, last = key.split("__")
+        if last in QUERY_OPS:
+            op = last
+            field = "__".join(parts)
+    if not field:
+        raise _invalid_field(field, model)
+    col, clauses = _resolve_member_column(model, field)
+    return (op, col, clauses)
 
 
 def atom_member_to_sql_column(
@@ -335,6 +484,9 @@ def atom_member_to_sql_column(
     if hasattr(member, "get_column_type"):
         # Allow custom members to define the column type programatically
         return member.get_column_type(model)  # type: ignore
+    column_type = MEMBER_COLUMNS.get(type(member))
+    if column_type is not None:
+        return column_type(**kwargs)
     elif isinstance(member, api.Str):
         return sa.String(**kwargs)
     elif hasattr(api, "Unicode") and isinstance(member, api.Unicode):  # type: ignore
@@ -436,10 +588,7 @@ def create_table_column(model: Type["SQLModel"], member: Member) -> sa.Column:
     column_type = metadata.pop("type", None)
 
     # Extract column kwargs from member metadata
-    kwargs = {}
-    for k in COLUMN_KWARGS:
-        if k in metadata:
-            kwargs[k] = metadata.pop(k)
+    kwargs = {k: metadata.pop(k) for k in COLUMN_KWARGS_SET.intersection(metadata)}
 
     if column_type is None:
         args = atom_member_to_sql_column(model, member, **metadata)
@@ -469,14 +618,22 @@ def create_table(model: Type["SQLModel"], metadata: sa.MetaData) -> sa.Table:
 
     """
     name = model.__model__
-    members = model.members()
-    args = []
 
-    # Add columns
-    for f in model.__fields__:
-        column = create_table_column(model, members[f])
-        if column is not None:
-            args.append(column)
+    # Add columns. They are only generated once per model and copied if
+    # another table is created since a column can only belong to one table.
+    columns = model.__columns__
+    if columns is None:
+        members = model.members()
+        columns = model.__columns__ = tuple(
+            column
+            for column in (
+                create_table_column(model, members[f]) for f in model.__fields__
+            )
+            if column is not None
+        )
+        args = list(columns)
+    else:
+        args = [column.copy() for column in columns]
 
     # Add table metadata
     meta = getattr(model, "Meta", None)
@@ -575,6 +732,53 @@ class SQLModelSerializer(ModelSerializer):
         return registry
 
 
+class ObjectCache(weakref.WeakValueDictionary):
+    """A cache of objects by primary key using weakrefs which also keeps a
+    strong reference to the most recently cached objects so they are not
+    released as soon as they are no longer used elsewhere.
+
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        #: Number of strong references to keep
+        self.maxsize = maxsize
+
+        #: Recently cached objects in least to most recently used order
+        self.recent: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        recent = self.recent
+        obj = recent.get(key)
+        if obj is not None:
+            recent.move_to_end(key)
+            return obj
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        recent = self.recent
+        recent[key] = value
+        recent.move_to_end(key)
+        if len(recent) > self.maxsize:
+            recent.popitem(last=False)
+
+    def __delitem__(self, key):
+        # Remove the weak entry first as releasing the strong reference may
+        # remove it
+        super().__delitem__(key)
+        self.recent.pop(key, None)
+
+    def pop(self, key, *args):
+        result = super().pop(key, *args)
+        self.recent.pop(key, None)
+        return result
+
+    def clear(self):
+        self.recent.clear()
+        super().clear()
+
+
 class SQLModelManager(ModelManager):
     """Manages models via aiopg, aiomysql, or similar libraries supporting
     SQLAlchemy tables. It stores a table for each class and when accessed
@@ -594,12 +798,48 @@ class SQLModelManager(ModelManager):
     #: Cache results
     cache = Bool(True)
 
+    #: Number of recently restored objects of each model to keep a strong
+    #: reference to. By default objects are only cached while in use.
+    cache_size = Int(0)
+
+    @asynccontextmanager
+    async def session(self, database: str = "default"):
+        """Acquire a single connection which is reused by every query made
+        within the context that is not given a connection explicitly. This
+        avoids acquiring a connection from the pool for each query.
+
+        The session is inherited by any tasks created within it so do not
+        run queries concurrently while a session is active.
+
+        Parameters
+        ----------
+        database: String
+            The key of the database to connect to if the database of this
+            manager is a dict.
+
+        Yields
+        ------
+        connection: Database connection
+            The connection which is reused.
+
+        """
+        db = self.database
+        engine = db[database] if isinstance(db, dict) else db
+        async with engine.acquire() as connection:
+            token = _session.set((engine, connection))
+            try:
+                yield connection
+            finally:
+                _session.reset(token)
+
     def _default_metadata(self) -> sa.MetaData:
         binding = SQLBinding(manager=self)
         return sa.MetaData(binding, naming_convention=self.conventions)
 
     def create_tables(self) -> DictType[Type["SQLModel"], sa.Table]:
         """Create sqlalchemy tables for all registered SQLModels"""
+        # Any cached lookups may refer to members or tables that have changed
+        _clear_caches()
         tables = {}
         for cls in find_sql_models():
             table = cls.__table__
@@ -614,15 +854,18 @@ class SQLModelManager(ModelManager):
         self, obj: T, cls: Optional[Type[T]] = None
     ) -> Union["SQLTableProxy[T]", "SQLModelManager"]:
         """Retrieve the table for the requested object or class."""
-        cls = cls or obj.__class__
+        if cls is None:
+            cls = obj.__class__
+        try:
+            return self.proxies[cls]
+        except KeyError:
+            pass
         if not issubclass(cls, Model):
             return self  # Only return the client when used from a Model
-        proxy = self.proxies.get(cls)
-        if proxy is None:
-            table = cls.__table__
-            if table is None:
-                table = cls.__table__ = create_table(cls, self.metadata)
-            proxy = self.proxies[cls] = SQLTableProxy(table=table, model=cls)
+        table = cls.__table__
+        if table is None:
+            table = cls.__table__ = create_table(cls, self.metadata)
+        proxy = self.proxies[cls] = SQLTableProxy(table=table, model=cls)
         return proxy
 
     def _default_database(self):
@@ -632,13 +875,19 @@ class SQLModelManager(ModelManager):
         )
 
 
-class ConnectionProxy(Atom):
+class ConnectionProxy:
     """An wapper for a connection to be used with async with syntax that
     does nothing but passes the existing connection when entered.
 
+    This is created for every query using an existing connection so it is
+    kept as a plain slotted class.
+
     """
 
-    connection = Value()
+    __slots__ = ("connection",)
+
+    def __init__(self, connection: Any = None):
+        self.connection = connection
 
     async def __aenter__(self):
         return self.connection
@@ -647,6 +896,36 @@ class ConnectionProxy(Atom):
         pass
 
 
+class ClosingIterator(Generic[R]):
+    """A wrapper for an async generator which can be used with async for
+    directly or with async with syntax to close the generator, releasing
+    the connection it holds, when the block exits even if the iteration
+    was stopped early.
+
+    """
+
+    __slots__ = ("iterator",)
+
+    def __init__(self, iterator: AsyncGenerator[R, None]):
+        self.iterator = iterator
+
+    def __aiter__(self) -> AsyncGenerator[R, None]:
+        return self.iterator
+
+    async def __aenter__(self) -> AsyncGenerator[R, None]:
+        return self.iterator
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.iterator.aclose()
+
+    async def aclose(self):
+        """Close the generator. This only needs called when the iteration
+        is stopped early without using async with.
+
+        """
+        await self.iterator.aclose()
+
+
 class SQLTableProxy(Atom, Generic[T]):
     #: Table this is a proxy to
     table = Instance(sa.Table, optional=False)
@@ -655,11 +934,21 @@ class SQLTableProxy(Atom, Generic[T]):
     model = ForwardSubclass(lambda: SQLModel)
 
     #: Cache of pk: obj using weakrefs
-    cache = Typed(weakref.WeakValueDictionary, ())
+    cache = Typed(weakref.WeakValueDictionary)
 
     #: Key used to pull the connection out of filter kwargs
     connection_kwarg = Str("connection")
 
+    #: Cache of the joined tables for each set of related clauses
+    joins = Dict()
+
+    def _default_cache(self) -> weakref.WeakValueDictionary:
+        bind = self.table.bind
+        size = bind.manager.cache_size if bind is not None else 0
+        if size > 0:
+            return ObjectCache(size)
+        return weakref.WeakValueDictionary()
+
     #: Reference to the aiomysql or aiopg Engine
     #: This is used to get a connection from the connection pool.
     @property
@@ -672,7 +961,8 @@ class SQLTableProxy(Atom, Generic[T]):
 
     def connection(self, connection=None):
         """Create a new connection or the return given connection as an async
-        contextual object.
+        contextual object. If a session is active the connection of the
+        session is used instead of creating a new one.
 
         Parameters
         ----------
@@ -686,9 +976,54 @@ class SQLTableProxy(Atom, Generic[T]):
 
         """
         if connection is None:
-            return self.engine.acquire()
+            engine = self.engine
+            connection = _session_connection(engine)
+            if connection is None:
+                return engine.acquire()
         return ConnectionProxy(connection=connection)
 
+    def resolve_joins(
+        self, related_clauses: Sequence[str], outer_join: bool = False
+    ) -> TupleType[Any, TupleType[sa.Table, ...]]:
+        """Determine the tables needed to select the given related clauses.
+        The result is cached since the same joins are used by every query
+        with the same related clauses.
+
+        Parameters
+        ----------
+        related_clauses: List[str]
+            The related field paths to join
+        outer_join: Bool
+            Whether a left outer join is used
+
+        Returns
+        -------
+        result: Tuple[FromClause, Tuple[Table, ...]]
+            The clause to select from and the list of tables to select.
+
+        """
+        key = (tuple(related_clauses), outer_join)
+        result = self.joins.get(key)
+        if result is not None:
+            return result
+        from_table = self.table
+        tables = [from_table]
+        members = self.model.members()
+        for clause in related_clauses:
+            from_table = self.table
+            for part in clause.split("__"):
+                m = members.get(part)
+                assert m is not None
+                rel_model_types = resolve_member_types(m)
+                assert rel_model_types is not None
+                rel_model = rel_model_types[0]
+                assert issubclass(rel_model, Model)
+                table = rel_model.objects.table
+                from_table = sa.join(from_table, table, isouter=outer_join)
+                tables.append(table)
+        result = self.joins[key] = (from_table, tuple(tables))
+        return result
+
     def create_table(self):
         """A wrapper for create which catches the create queries then executes
         them
@@ -749,6 +1084,42 @@ class SQLTableProxy(Atom, Generic[T]):
             r = await conn.execute(query)
             return await r.fetchmany(size)
 
+    def fetchiter(
+        self, query: QueryType, connection=None, batch_size=1000
+    ) -> ClosingIterator:
+        """Iterate over the results for the query fetching batch_size rows at
+        a time instead of fetching all of them at once.
+
+        The connection is held until the iteration completes. If it may be
+        stopped early use async with to release it when the block exits.
+
+        Parameters
+        ----------
+        query: String or Query
+            The query to execute
+        connection: Database connection
+            The connection to use or a new one will be created
+        batch_size: Int
+            The number of rows to fetch at a time
+
+        Returns
+        -------
+        rows: ClosingIterator
+            An async iterator of each row returned, NOT objects
+
+        """
+        return ClosingIterator(self._fetchiter(query, connection, batch_size))
+
+    async def _fetchiter(self, query: QueryType, connection, batch_size: int):
+        async with self.connection(connection) as conn:
+            r = await conn.execute(query)
+            while True:
+                rows = await r.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+
     async def fetchone(self, query: QueryType, connection=None):
         """Fetch a single result for the query.
 
@@ -840,46 +1211,109 @@ class SQLTableProxy(Atom, Generic[T]):
         return getattr(qs, name)
 
 
-class SQLQuerySet(Atom, Generic[T]):
-    #: Proxy
-    proxy = Instance(SQLTableProxy, optional=False)
-    connection = Value()
+class SQLQuerySet(Generic[T]):
+    """A queryset used to build up a query. Every method returns a modified
+    clone instead of changing the queryset.
+
+    This is a plain slotted class instead of an Atom since it is created
+    for every query and the attributes are read many times when it is built.
 
-    filter_clauses = List()
-    related_clauses = List()
-    outer_join = Bool()
-    order_clauses = List()
-    distinct_clauses = List()
-    limit_count = Int()
-    query_offset = Int()
+    """
+
+    #: Attributes passed to a clone
+    __state__ = (
+        "proxy",
+        "connection",
+        "filter_clauses",
+        "related_clauses",
+        "outer_join",
+        "order_clauses",
+        "distinct_clauses",
+        "limit_count",
+        "query_offset",
+    )
+
+    __slots__ = __state__ + ("_where", "_statements", "_result")
+
+    def __init__(
+        self,
+        proxy: SQLTableProxy,
+        connection: Any = None,
+        filter_clauses: TupleType[Any, ...] = (),
+        related_clauses: TupleType[str, ...] = (),
+        outer_join: bool = False,
+        order_clauses: TupleType[Any, ...] = (),
+        distinct_clauses: TupleType[Any, ...] = (),
+        limit_count: int = 0,
+        query_offset: int = 0,
+    ):
+        self.proxy = proxy
+        self.connection = connection
+        self.filter_clauses = filter_clauses
+        self.related_clauses = related_clauses
+        self.outer_join = outer_join
+        self.order_clauses = order_clauses
+        self.distinct_clauses = distinct_clauses
+        self.limit_count = limit_count
+        self.query_offset = query_offset
+
+        #: The where clause built from the filter clauses
+        self._where = None
+
+        #: Statements built for each query type
+        self._statements: Optional[DictType[str, Any]] = None
+
+        #: Future of the results when the queryset is awaited
+        self._result: Optional[asyncio.Future] = None
 
     def clone(self, **kwargs) -> "SQLQuerySet[T]":
-        state = self.__getstate__()
+        state = {name: getattr(self, name) for name in self.__state__}
         state.update(kwargs)
         return self.__class__(**state)
 
     def query(self, query_type: str = "select", *columns, **kwargs):
         if kwargs:
             return self.filter(**kwargs).query(query_type)
-        p = self.proxy
-        from_table = p.table
-        tables = [from_table]
-        model = p.model
-        members = model.members()
-        use_labels = bool(self.related_clauses)
-        outer_join = self.outer_join
-        for clause in self.related_clauses:
-            from_table = p.table
-            for part in clause.split("__"):
-                m = members.get(part)
-                assert m is not None
-                rel_model_types = resolve_member_types(m)
-                assert rel_model_types is not None
-                rel_model = rel_model_types[0]
-                assert issubclass(rel_model, Model)
-                table = rel_model.objects.table
-                from_table = sa.join(from_table, table, isouter=outer_join)
-                tables.append(table)
+        if columns:
+            return self._build_query(query_type, *columns)
+
+        # The queryset never changes so the statement for each query type is
+        # only built once and reused if the queryset is executed again
+        statements = self._statements
+        if statements is None:
+            statements = self._statements = {}
+        q = statements.get(query_type)
+        if q is None:
+            q = statements[query_type] = self._build_query(query_type)
+        return q
+
+    def _build_query(self, query_type: str = "select", *columns):
+        """Build the sqlalchemy statement for this queryset.
+
+        Parameters
+        ----------
+        query_type: String
+            Either select, delete, or update.
+        columns: List[Column]
+            Columns to select instead of all the columns of the tables
+
+        Returns
+        -------
+        query: Executable
+            The sqlalchemy statement
+
+        """
+        related_clauses = self.related_clauses
+        if related_clauses:
+            from_table, tables = self.proxy.resolve_joins(
+                related_clauses, self.outer_join
+            )
+            use_labels = True
+        else:
+            # Most queries do not join any related tables
+            from_table = self.proxy.table
+            tables = (from_table,)
+            use_labels = False
 
         if query_type == "select":
             q = sa.select(columns or tables, use_labels=use_labels)
@@ -894,11 +1328,17 @@ class SQLQuerySet(Atom, Generic[T]):
         if self.distinct_clauses:
             q = q.distinct(*self.distinct_clauses)
 
-        if self.filter_clauses:
-            if len(self.filter_clauses) == 1:
-                q = q.where(self.filter_clauses[0])
+        # The filters never change so the where clause is only built once
+        where = self._where
+        if where is None and self.filter_clauses:
+            filter_clauses = self.filter_clauses
+            if len(filter_clauses) == 1:
+                where = filter_clauses[0]
             else:
-                q = q.where(sa.and_(*self.filter_clauses))
+                where = sa.and_(*filter_clauses)
+            self._where = where
+        if where is not None:
+            q = q.where(where)
 
         if self.order_clauses:
             q = q.order_by(*self.order_clauses)
@@ -930,7 +1370,7 @@ class SQLQuerySet(Atom, Generic[T]):
 
         """
         outer_join = self.outer_join if outer_join is None else outer_join
-        related_clauses = self.related_clauses + list(related)
+        related_clauses = self.related_clauses + tuple(related)
         return self.clone(related_clauses=related_clauses, outer_join=outer_join)
 
     def order_by(self, *args):
@@ -947,8 +1387,12 @@ class SQLQuerySet(Atom, Generic[T]):
             A clone of this queryset with the ordering terms added.
 
         """
-        order_clauses = self.order_clauses[:]
-        related_clauses = self.related_clauses[:]
+        order_clauses = list(self.order_clauses)
+        related_clauses = list(self.related_clauses)
+
+        # Checking if a clause is in the list uses sqlalchemy's __eq__ which
+        # creates a new expression for each comparison so use the id instead
+        seen = {id(clause) for clause in order_clauses}
         model = self.proxy.model
         for arg in args:
             if isinstance(arg, str):
@@ -968,9 +1412,12 @@ class SQLQuerySet(Atom, Generic[T]):
                     clause = col.desc()
             else:
                 clause = arg
-            if clause not in order_clauses:
+            if id(clause) not in seen:
+                seen.add(id(clause))
                 order_clauses.append(clause)
-        return self.clone(order_clauses=order_clauses, related_clauses=related_clauses)
+        return self.clone(
+            order_clauses=tuple(order_clauses), related_clauses=tuple(related_clauses)
+        )
 
     def distinct(self, *args):
         """Apply distinct on the given column.
@@ -986,8 +1433,9 @@ class SQLQuerySet(Atom, Generic[T]):
             A clone of this queryset with the distinct terms added.
 
         """
-        distinct_clauses = self.distinct_clauses[:]
-        related_clauses = self.related_clauses[:]
+        distinct_clauses = list(self.distinct_clauses)
+        related_clauses = list(self.related_clauses)
+        seen = {id(clause) for clause in distinct_clauses}
         model = self.proxy.model
         for arg in args:
             if isinstance(arg, str):
@@ -995,10 +1443,12 @@ class SQLQuerySet(Atom, Generic[T]):
                 clause = resolve_member_column(model, arg, related_clauses)
             else:
                 clause = arg
-            if clause not in distinct_clauses:
+            if id(clause) not in seen:
+                seen.add(id(clause))
                 distinct_clauses.append(clause)
         return self.clone(
-            distinct_clauses=distinct_clauses, related_clauses=related_clauses
+            distinct_clauses=tuple(distinct_clauses),
+            related_clauses=tuple(related_clauses),
         )
 
     def filter(self, *args, **kwargs: DictType[str, Any]):
@@ -1019,26 +1469,25 @@ class SQLQuerySet(Atom, Generic[T]):
 
         """
         p = self.proxy
-        filter_clauses = self.filter_clauses + list(args)
-        related_clauses = self.related_clauses[:]
+        filter_clauses = list(self.filter_clauses)
+        filter_clauses.extend(args)
+        related_clauses = list(self.related_clauses)
 
         connection_kwarg = p.connection_kwarg
         connection = self.connection
+        model = p.model
 
         # Build the filter operations
+        terms = []
         for k, v in kwargs.items():
             # Ignore connection parameter
             if k == connection_kwarg:
                 connection = v
                 continue
-            model = p.model
-            op = "eq"
-            if "__" in k:
-                parts = k.split("__")
-                if parts[-1] in QUERY_OPS:
-                    op = parts[-1]
-                    k = "__".join(parts[:-1])
-            col = resolve_member_column(model, k, related_clauses)
+            op, col, clauses = _parse_filter_key(model, k)
+            for clause in clauses:
+                if clause not in related_clauses:
+                    related_clauses.append(clause)
 
             # Support lookups by model
             if isinstance(v, Model):
@@ -1047,13 +1496,19 @@ class SQLQuerySet(Atom, Generic[T]):
                 # Flatten lists when using in or notin ops
                 v = model.serializer.flatten(v, scope={})
 
-            clause = getattr(col, QUERY_OPS[op])(v)
-            filter_clauses.append(clause)
+            clause = QUERY_OP_FUNCS[op](col, v)
+            terms.append((QUERY_OP_ORDER.get(op, 3), clause))
+
+        # Add the most selective terms first, sqlalchemy filters given as
+        # args are kept in the order given before them
+        if len(terms) > 1:
+            terms.sort(key=itemgetter(0))
+        filter_clauses.extend(clause for order, clause in terms)
 
         return self.clone(
             connection=connection,
-            filter_clauses=filter_clauses,
-            related_clauses=related_clauses,
+            filter_clauses=tuple(filter_clauses),
+            related_clauses=tuple(related_clauses),
         )
 
     def __getitem__(self, key):
@@ -1065,6 +1520,8 @@ class SQLQuerySet(Atom, Generic[T]):
             offset = key
         else:
             raise TypeError("Invalid key")
+        if not isinstance(offset, int) or not isinstance(limit, int):
+            raise TypeError("Invalid key")
         if offset < 0:
             raise ValueError("Cannot use a negative offset")
         if limit < 0:
@@ -1072,9 +1529,13 @@ class SQLQuerySet(Atom, Generic[T]):
         return self.clone(limit_count=limit, query_offset=offset)
 
     def limit(self, limit: int):
+        if not isinstance(limit, int):
+            raise TypeError("Limit must be an int")
         return self.clone(limit_count=limit)
 
     def offset(self, offset: int):
+        if not isinstance(offset, int):
+            raise TypeError("Offset must be an int")
         return self.clone(query_offset=offset)
 
     # -------------------------------------------------------------------------
@@ -1125,14 +1586,21 @@ class SQLQuerySet(Atom, Generic[T]):
             q = q.distinct()
         cursor = await self.proxy.fetchall(q, connection=self.connection)
         if flat:
-            return [row[0] for row in cursor]
+            return list(map(itemgetter(0), cursor))
         return cursor
 
     async def count(self, *args, **kwargs) -> int:
         if args or kwargs:
             return await self.filter(*args, **kwargs).count()
-        subq = self.query("select").alias("subquery")
-        q = sa.func.count().select().select_from(subq)
+        if self.distinct_clauses or self.limit_count or self.query_offset:
+            # These change which rows are selected so count the selected rows
+            subq = self.query("select").alias("subquery")
+            q = sa.func.count().select().select_from(subq)
+        else:
+            # Otherwise count the filtered rows directly, the order does not
+            # change the count and cannot be used with the aggregate
+            qs = self.clone(order_clauses=()) if self.order_clauses else self
+            q = qs.query("select", sa.func.count())
         return await self.proxy.scalar(q, connection=self.connection)
 
     def max(self, *columns):
@@ -1161,10 +1629,16 @@ class SQLQuerySet(Atom, Generic[T]):
     async def exists(self, *args, **kwargs) -> bool:
         if args or kwargs:
             return await self.filter(*args, **kwargs).exists()
-        q = sa.exists(self.query("select")).select()
+        # Only one row needs to be found
+        q = self.query("select")
+        if self.limit_count != 1:
+            q = q.limit(1)
+        q = sa.exists(q).select()
         return await self.proxy.scalar(q, connection=self.connection)
 
     async def delete(self, *args, **kwargs):
+        # The results of an earlier await are no longer valid
+        self._result = None
         if args or kwargs:
             return await self.filter(*args, **kwargs).delete()
         q = self.query("delete")
@@ -1172,26 +1646,82 @@ class SQLQuerySet(Atom, Generic[T]):
 
     async def update(self, **values):
         """Perform an update of the given values."""
+        # The results of an earlier await are no longer valid
+        self._result = None
+
         # Translate any renamed fields back to the database value
-        for py_name, db_name in self.proxy.model.__renamed_fields__.items():
-            if py_name in values:
-                values[db_name] = values.pop(py_name)
+        column_names = self.proxy.model.__column_names__
+        values = {column_names.get(k, k): v for k, v in values.items()}
         q = self.query("update").values(**values)
         return await self.proxy.execute(q, connection=self.connection)
 
     def __await__(self):
-        # So await Model.objects.filter() works
-        f = asyncio.ensure_future(self.all())
-        yield from f
-        return f.result()
+        """So await Model.objects.filter() works.
+
+        The results are kept so awaiting the same queryset again does not
+        repeat the query. They are cleared by update and delete of this
+        queryset but not by changes made any other way, such as saving an
+        object, so call all() to fetch the current results. Each await gets
+        a new list so changing it does not change the results of the next
+        await.
+
+        """
+        f = self._result
+        if f is None:
+            f = self._result = asyncio.ensure_future(self.all())
+        try:
+            yield from f
+        except BaseException:
+            self._result = None  # Allow retrying
+            raise
+        return list(f.result())
 
     async def all(self, *args, **kwargs) -> Sequence[T]:
         if args or kwargs:
             return await self.filter(*args, **kwargs).all()
         q = self.query("select")
-        restore = self.proxy.model.restore
         cursor = await self.proxy.fetchall(q, connection=self.connection)
-        return [cast(T, await restore(row)) for row in cursor]
+        objects = await self.proxy.model.restore_many(cursor)
+        return cast(ListType[T], objects)
+
+    def iterate(self, batch_size: int = 1000) -> ClosingIterator[T]:
+        """Iterate over the objects matching the query without loading all
+        of the rows at once. Use this instead of all for large results.
+
+        The connection is held until the iteration completes. If it may be
+        stopped early use async with to release it when the block exits.
+
+        Parameters
+        ----------
+        batch_size: Int
+            The number of rows to fetch at a time
+
+        Returns
+        -------
+        objects: ClosingIterator[Model]
+            An async iterator of each object matching the query
+
+        """
+        return ClosingIterator(self._iterate(batch_size))
+
+    async def _iterate(self, batch_size: int) -> AsyncGenerator[T, None]:
+        q = self.query("select")
+        model = self.proxy.model
+        iterator = self.proxy.fetchiter(
+            q, connection=self.connection, batch_size=batch_size
+        )
+        async with iterator as rows:
+            if model._restore_overridden():
+                async for row in rows:
+                    yield cast(T, await model.restore(row))
+                return
+
+            restore_cached = model._restore_cached
+            async for row in rows:
+                obj, needs_restore = restore_cached(row)
+                if needs_restore:
+                    await obj.__restorestate__(row)
+                yield cast(T, obj)
 
     async def get(self, *args, **kwargs) -> Optional[T]:
         """Get the first result matching the query. Unlike django this will
@@ -1206,7 +1736,10 @@ class SQLQuerySet(Atom, Generic[T]):
         """
         if args or kwargs:
             return await self.filter(*args, **kwargs).get()
+        # Only the first row is used so don't have the database return more
         q = self.query("select")
+        if self.limit_count != 1:
+            q = q.limit(1)
         row = await self.proxy.fetchone(q, connection=self.connection)
         if row is None:
             return None
@@ -1218,7 +1751,7 @@ class SQLBinding(Atom):
     manager = Instance(SQLModelManager)
 
     #: The queue
-    queue = ContainerList()
+    queue = Typed(deque, ())
 
     engine = property(lambda s: s)
 
@@ -1278,22 +1811,98 @@ class SQLBinding(Atom):
         else:
             engine = db
         result = None
-        async with engine.acquire() as conn:
+        connection = _session_connection(engine)
+        if connection is not None:
+            context = ConnectionProxy(connection=connection)
+        else:
+            context = engine.acquire()
+        async with context as conn:
             try:
                 while self.queue:
-                    op, args, kwargs = self.queue.pop(0)
+                    op, args, kwargs = self.queue.popleft()
                     result = await conn.execute(op, args)
             finally:
-                self.queue = []  # Wipe queue on error
+                self.queue.clear()  # Wipe queue on error
         return result
 
 
+@lru_cache(maxsize=None)
+def _restore_plan(model: Type["SQLModel"]) -> TupleType[RestoreSpec, ...]:
+    """Determine how each member of the model is restored from a database
+    row so it is only worked out once. The result is cached for each model.
+
+    """
+    table_name = model.objects.table.name
+    column_names = model.__column_names__
+    plan = []
+    for name, m in model.members().items():
+        column_name = column_names[name]
+        field_label = f"{table_name}_{column_name}"
+        kind, related, rel_pk_label = RESTORE_FIELD, None, ""
+        if isinstance(m, FK_TYPES):
+            RelModelTypes = resolve_member_types(m)
+            assert RelModelTypes is not None
+            related = RelModelTypes[0]
+            if issubclass(related, SQLModel):
+                kind = RESTORE_FK
+                rel_pk_label = related.__pk_label__
+            elif issubclass(related, JSONModel):
+                kind = RESTORE_JSON
+        elif isinstance(m, Relation):
+            related = (m.metadata or {}).get("through")
+            kind = RESTORE_M2M if related else RESTORE_RELATION
+        plan.append((name, column_name, field_label, kind, related, rel_pk_label))
+    return tuple(plan)
+
+
+def _refers_to(obj: Model, fields: Sequence[str], ids: SetType[int]) -> bool:
+    """Check if any of the fields of the object refer to an object with an
+    id in the given set either directly or within a list or tuple.
+
+    """
+    for f in fields:
+        v = getattr(obj, f, None)
+        if id(v) in ids:
+            return True
+        if isinstance(v, (list, tuple)) and any(id(item) in ids for item in v):
+            return True
+    return False
+
+
+def generate_prepare_state(cls: Type["SQLModel"]) -> CallableType[..., StateType]:
+    """Generate a function which converts the state of a model into the
+    values saved to the database with each excluded and renamed field
+    written out instead of looping over them on every save.
+
+    Parameters
+    ----------
+    cls: Type[SQLModel]
+        The model class to generate the function for.
+
+    Returns
+    -------
+    prepare_state: Callable
+        A function accepting the model and its state which returns the state
+        with excluded fields removed and renamed fields using their column
+        name.
+
+    """
+    lines = ["def prepare_state(self, state):"]
+    for f in sorted(cls.__excluded_fields__):
+        lines.append(f"    state.pop({f!r}, None)")
+    for py_name, db_name in cls.__renamed_fields__.items():
+        lines.append(f"    state[{db_name!r}] = state.pop({py_name!r})")
+    lines.append("    return state")
+    namespace: DictType[str, Any] = {}
+    exec("\n".join(lines), namespace)
+    return namespace["prepare_state"]
+
+
 class SQLMeta(ModelMeta):
     """Both the pk and _id are aliases to the primary key"""
 
     def __new__(meta, name, bases, dct):
         cls = ModelMeta.__new__(meta, name, bases, dct)
-
         members = cls.members()
 
         # If a member tagged with primary_key=True is defined,
@@ -1339,6 +1948,10 @@ class SQLMeta(ModelMeta):
         # Set to the sqlalchemy Table
         cls.__table__ = None
 
+        # Set to the columns generated from the fields when the table is
+        # first created
+        cls.__columns__ = None
+
         # Will be set to the table model by manager, not done here to avoid
         # import errors that may occur
         cls.__backrefs__ = set()
@@ -1378,22 +1991,38 @@ class SQLMeta(ModelMeta):
         # this removes Relation instances and several needed for json
         excluded_fields = cls.__excluded_fields__ = {"__model__", "__ref__", "_id"}
 
-        for name, member in cls.members().items():
+        for name, member in members.items():
             if isinstance(member, Relation):
                 excluded_fields.add(name)
 
         # Cache the mapping of any renamed fields
         renamed_fields = cls.__renamed_fields__ = {}
-        for old_name, member in cls.members().items():
+        for old_name, member in members.items():
             if old_name in excluded_fields:
                 continue  # Ignore excluded fields
             if member.metadata:
                 new_name = member.metadata.get("name")
                 if new_name is not None:
                     renamed_fields[old_name] = new_name
+        cls.__prepare_state__ = generate_prepare_state(cls)
+
+        # Cache the column name of every member
+        cls.__column_names__ = {
+            name: (member.metadata or {}).get("name", name)
+            for name, member in members.items()
+        }
+
+        # The label of the pk column when the table is selected with labels
+        cls.__pk_label__ = f"{cls.__model__}_{cls.__pk__}"
 
         return cls
 
+    def __init__(cls, name, bases, dct):
+        super().__init__(name, bases, dct)
+
+        # The list of models has changed
+        _clear_caches()
+
 
 class SQLModel(Model, metaclass=SQLMeta):
     """A model that can be saved and restored to and from a database supported
@@ -1411,12 +2040,24 @@ class SQLModel(Model, metaclass=SQLMeta):
     #: Mapping is class attr -> database column name.
     __renamed_fields__: ClassVar[DictType[str, str]]
 
+    #: Function which converts the state into the values to save
+    __prepare_state__: ClassVar[CallableType[..., StateType]]
+
+    #: Mapping of each member name to its column name
+    __column_names__: ClassVar[DictType[str, str]]
+
+    #: Label of the primary key column in a query using labels
+    __pk_label__: ClassVar[str]
+
     #: Set of fields to exclude from the database
     __excluded_fields__: ClassVar[SetType[str]]
 
     #: Reference to the sqlalchemy table backing this model
     __table__: ClassVar[Optional[sa.Table]]
 
+    #: Columns generated for the fields of this model
+    __columns__: ClassVar[Optional[TupleType[sa.Column, ...]]]
+
     #: Database name. If the `database` field of the manager is a dict
     #: This field will be used to determine which engine to use.
     __database__: ClassVar[str] = "default"
@@ -1437,11 +2078,39 @@ class SQLModel(Model, metaclass=SQLMeta):
         """Restore an object from the database using the primary key. Save
         a ref in the table's object cache.  If force is True, update
         the cache if it exists.
+        """
+        obj, needs_restore = cls._restore_cached(state, force)
+        if needs_restore:
+            await obj.__restorestate__(state)
+        return obj
+
+    @classmethod
+    def _restore_overridden(cls) -> bool:
+        """Check if a subclass overrides restore in which case it must be
+        used to restore every row instead of the bulk restore path.
+
+        """
+        return cls.restore.__func__ is not SQLModel.restore.__func__  # type: ignore
+
+    @classmethod
+    def _restore_cached(
+        cls: Type[T], state: StateType, force: Optional[bool] = None
+    ) -> TupleType[T, bool]:
+        """Lookup the object for the state in the table's object cache or
+        create and cache a new one. This does not need to await anything so
+        it is kept separate from restore for callers to skip the coroutine
+        when the cached object is already restored.
+
+        Returns
+        -------
+        result: Tuple[Model, Bool]
+            The object and whether its state still needs to be restored.
+
         """
         try:
             # When sqlalchemy does a join the key will have a prefix
             # of the database name
-            pk = state[f"{cls.__model__}_{cls.__pk__}"]
+            pk = state[cls.__pk_label__]
         except KeyError:
             pk = state[cls.__pk__]
 
@@ -1456,78 +2125,143 @@ class SQLModel(Model, metaclass=SQLMeta):
             # Create and cache it
             obj = cls.__new__(cls)
             cache[pk] = obj
+            return (obj, True)
+        return (obj, force or not obj.__restored__)
 
-            # This ideally should only be done if created
-            await obj.__restorestate__(state)
-        elif force or not obj.__restored__:
-            await obj.__restorestate__(state)
+    @classmethod
+    async def restore_many(
+        cls: Type[T],
+        states: Sequence[StateType],
+        force: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> ListType[T]:
+        """Restore a list of objects from rows of the same query. This does
+        the same as restore for each row but the pk key, cache, and force
+        default are only looked up once.
+
+        Rows are restored one at a time instead of gathered because restoring
+        relations may query the database.
+
+        If restore is overridden it is called for each row with the force
+        and any other kwargs. Otherwise the kwargs are ignored as they are
+        by restore.
 
-        return obj
+        """
+        if cls._restore_overridden():
+            return await super().restore_many(states, force=force, **kwargs)
+        if not states:
+            return []
+
+        # All rows of a query have the same keys so check the first one
+        pk_key = cls.__pk_label__
+        if pk_key not in states[0]:
+            pk_key = cls.__pk__
+
+        if force is None:
+            force = not cls.objects.table.bind.manager.cache
+
+        # Find the objects that need restored, each only once
+        cache = cls.objects.cache
+        objects = []
+        pending: DictType[Any, TupleType[T, StateType]] = {}
+        for state in states:
+            pk = state[pk_key]
+            obj = cache.get(pk)
+            if obj is None:
+                obj = cls.__new__(cls)
+                obj._id = pk
+                cache[pk] = obj
+                pending[pk] = (obj, state)
+            elif (force or not obj.__restored__) and pk not in pending:
+                pending[pk] = (obj, state)
+            objects.append(obj)
+
+        # Joined rows restore relations using a through table, load them for
+        # all of the objects with one query per relation instead of per row.
+        # An overridden __restorestate__ may not accept the prefetched
+        # relations so it loads them itself.
+        prefetched = None
+        overridden = cls.__restorestate__ is not SQLModel.__restorestate__
+        if pending and pk_key != cls.__pk__ and not overridden:
+            for name, _, _, kind, through, _ in _restore_plan(cls):
+                if kind != RESTORE_M2M:
+                    continue
+                M2M, this_attr, rel_attr = through()
+                groups: DictType[Any, ListType[Any]] = {pk: [] for pk in pending}
+                q = M2M.objects.filter(**{f"{this_attr}__in": list(pending)})
+                for r in await q:
+                    groups[getattr(r, this_attr)._id].append(getattr(r, rel_attr))
+                if prefetched is None:
+                    prefetched = {}
+                prefetched[name] = groups
+
+        if prefetched is None:
+            for obj, state in pending.values():
+                await obj.__restorestate__(state)
+        else:
+            for obj, state in pending.values():
+                await obj.__restorestate__(state, prefetched=prefetched)
+        return objects
 
     async def __restorestate__(
-        self: T, state: StateType, scope: Optional[ScopeType] = None
+        self: T,
+        state: StateType,
+        scope: Optional[ScopeType] = None,
+        prefetched: Optional[DictType[str, DictType[Any, ListType[Any]]]] = None,
     ):
         # Holds cleaned state extracted for this model which may come from
         # a DB row using labels or renamed columns
         cleaned_state: StateType = {}
+        plan = _restore_plan(type(self))
 
         # Check if the state is using labels by looking for the pk field
-        pk_label = f"{self.__model__}_{self.__pk__}"
+        pk_label = self.__pk_label__
 
         if pk_label in state:
-            # Convert row to dict because it speeds up lookups
-            state = dict(state)
+            # The row is not copied into a dict since only the columns of
+            # this model are read from what may be a wide join
             # Convert the joined tables into nested states
-            table = self.objects.table
-            table_name = table.name
             pk = state[pk_label]
 
             # Pull known
-            for name, m in self.members().items():
-                metadata = m.metadata or {}
-                field_name = metadata.get("name", name)
-                field_label = f"{table_name}_{field_name}"
-
-                if isinstance(m, FK_TYPES):
-                    RelModelTypes = resolve_member_types(m)
-                    assert RelModelTypes is not None
-                    RelModel = RelModelTypes[0]
-                    if issubclass(RelModel, SQLModel):
-                        # If the related model was joined, the pk field should
-                        # exist so automatically restore that as well
-                        rel_pk_name = f"{RelModel.__model__}_{RelModel.__pk__}"
-                        try:
-                            rel_id = state[field_label]
-                        except KeyError:
-                            rel_id = state.get(rel_pk_name)
-                        if rel_id:
-                            # Lookup in cache first to avoid recursion errors
-                            cache = RelModel.objects.cache
-                            obj = cache.get(rel_id)
-                            if obj is None:
-                                if rel_pk_name in state:
-                                    obj = await RelModel.restore(state)
-                                else:
-                                    # Create an unloaded model
-                                    obj = RelModel.__new__(RelModel)
-                                    cache[rel_id] = obj
-                                    obj._id = rel_id
-                            cleaned_state[name] = obj
-                            continue
-
-                elif isinstance(m, Relation):
-                    # Through must be a callable which returns a tuple of
-                    # the through table model
-                    through_factory = metadata.get("through")
-                    if through_factory:
-                        M2M, this_attr, rel_attr = through_factory()
+            for name, _, field_label, kind, related, rel_pk_label in plan:
+                if kind == RESTORE_FK:
+                    # If the related model was joined, the pk field should
+                    # exist so automatically restore that as well
+                    try:
+                        rel_id = state[field_label]
+                    except KeyError:
+                        rel_id = state.get(rel_pk_label)
+                    if rel_id:
+                        # Lookup in cache first to avoid recursion errors
+                        cache = related.objects.cache
+                        obj = cache.get(rel_id)
+                        if obj is None:
+                            if rel_pk_label in state:
+                                obj = await related.restore(state)
+                            else:
+                                # Create an unloaded model
+                                obj = related.__new__(related)
+                                cache[rel_id] = obj
+                                obj._id = rel_id
+                        cleaned_state[name] = obj
+                        continue
+
+                elif kind == RESTORE_M2M:
+                    if prefetched is not None:
+                        # Already loaded by restore_many
+                        cleaned_state[name] = prefetched[name][pk]
+                    else:
+                        # Through must be a callable which returns a tuple of
+                        # the through table model
+                        M2M, this_attr, rel_attr = related()
                         cleaned_state[name] = [
                             getattr(r, rel_attr)
                             for r in await M2M.objects.filter(**{this_attr: pk})
                         ]
-                    else:
-                        # Skip relations
-                        continue
+                elif kind == RESTORE_RELATION:
+                    # Skip relations
+                    continue
 
                 # Regular fields
                 try:
@@ -1537,30 +2271,25 @@ class SQLModel(Model, metaclass=SQLMeta):
 
         else:
             # If any column names were redefined use those instead
-            for name, m in self.members().items():
-                field_name = (m.metadata or {}).get("name", name)
-
+            for name, column_name, _, kind, related, _ in plan:
                 try:
-                    v = state[field_name]
+                    v = state[column_name]
                 except KeyError:
                     continue
 
                 # Attempt to lookup related fields from the cache
-                if v is not None and isinstance(m, FK_TYPES):
-                    RelModelTypes = resolve_member_types(m)
-                    assert RelModelTypes is not None
-                    RelModel = RelModelTypes[0]
-                    if issubclass(RelModel, SQLModel):
-                        cache = RelModel.objects.cache
+                if v is not None:
+                    if kind == RESTORE_FK:
+                        cache = related.objects.cache
                         obj = cache.get(v)
                         if obj is None:
                             # Create an unloaded model
-                            obj = RelModel.__new__(RelModel)
+                            obj = related.__new__(related)
                             cache[v] = obj
                             obj._id = v
                         v = obj
-                    elif issubclass(RelModel, JSONModel):
-                        v = await RelModel.restore(v)
+                    elif kind == RESTORE_JSON:
+                        v = await related.restore(v)
 
                 cleaned_state[name] = v
         await super().__restorestate__(cleaned_state, scope)
@@ -1600,6 +2329,116 @@ class SQLModel(Model, metaclass=SQLMeta):
         state = await db.fetchone(q, connection=connection)
         await self.__restorestate__(state)
 
+    def _prepare_state(self) -> DictType[str, Any]:
+        """Get the state of this object to save to the database. Fields that
+        are not stored in the database are removed and renamed fields use
+        their column name.
+
+        """
+        return self.__prepare_state__(self.__getstate__())
+
+    @classmethod
+    async def save_many(
+        cls: Type[T], objects: Sequence[T], connection=None, chunk_size: int = 500
+    ):
+        """Save many objects of this model to the database using a single
+        connection. The result is the same as saving each object in order.
+
+        Consecutive new objects are inserted with one query for each chunk
+        of objects when the database can return the generated primary keys.
+        The returned rows are matched to the objects using the first unique
+        column of the table since the order of the rows is not guaranteed.
+        Pending inserts are done before saving an object that already
+        exists or one that refers to a pending object so the primary key is
+        set when the reference is saved.
+
+        New objects inserted in bulk do not call save so every object is
+        saved individually if save is overridden. Objects are also saved
+        individually if the table has no unique column, if the object has
+        no value for it, or on databases, such as MySQL, that cannot return
+        the generated primary keys.
+
+        Parameters
+        ----------
+        objects: Sequence[Model]
+            The objects to save
+        connection: Database connection
+            The connection instance to use in a transaction
+        chunk_size: Int
+            The maximum number of objects to insert in a single query
+
+        """
+        db = cls.objects
+        table = db.table
+        pk = cls.__pk__
+        key = next((c.name for c in table.columns if c.unique and c.name != pk), None)
+        bulk = db.engine.dialect.implicit_returning and cls.save is SQLModel.save
+        async with db.connection(connection) as conn:
+            if key is None or not bulk:
+                for obj in objects:
+                    await obj.save(connection=conn)
+                return
+
+            key_column = table.c[key]
+            cache = db.cache
+            fields = cls.__fields__
+            pending: DictType[Any, TupleType[T, StateType]] = {}
+            pending_ids: SetType[int] = set()
+
+            async def insert_pending():
+                if not pending:
+                    return
+                q = (
+                    table.insert()
+                    .values([state for obj, state in pending.values()])
+                    .returning(table.c[pk], key_column)
+                )
+                r = await conn.execute(q)
+                for row in await r.fetchall():
+                    obj = pending[row[1]][0]
+                    obj._id = row[0]
+                    obj.__restored__ = True
+
+                    # Save a ref to the object in the model cache
+                    cache[obj._id] = obj
+                pending.clear()
+                pending_ids.clear()
+
+            for obj in objects:
+                # The state flattens references to their pk so any pending
+                # objects must be inserted first
+                if pending_ids and _refers_to(obj, fields, pending_ids):
+                    await insert_pending()
+
+                if obj._id:
+                    # Keep the order of saves
+                    await insert_pending()
+                    await obj.save(connection=conn)
+                    continue
+
+                state = obj._prepare_state()
+                value = state.get(key)
+                if value is None:
+                    # The row cannot be matched so insert it individually
+                    await insert_pending()
+                    await obj.save(connection=conn)
+                    continue
+
+                # Postgres errors if using None for the pk
+                state.pop(pk, None)
+
+                # Every row of an insert must have the same columns and each
+                # row must have a different key to match it to the object
+                if pending and (
+                    len(pending) >= chunk_size
+                    or value in pending
+                    or next(iter(pending.values()))[1].keys() != state.keys()
+                ):
+                    await insert_pending()
+                pending[value] = (obj, state)
+                pending_ids.add(id(obj))
+            await insert_pending()
+
     async def save(
         self: T,
         force_insert: bool = False,
@@ -1630,16 +2469,7 @@ class SQLModel(Model, metaclass=SQLMeta):
             raise ValueError("Cannot use force_insert and force_update together")
 
         db = self.objects
-        state = self.__getstate__()
-
-        # Remove any fields are in the state but should not go into the db
-        for f in self.__excluded_fields__:
-            state.pop(f, None)
-
-        # Replace any renamed fields
-        for py_name, db_name in self.__renamed_fields__.items():
-            state[db_name] = state.pop(py_name)
-
+        state = self._prepare_state()
         table = db.table
         async with db.connection(connection) as conn:
             if force_update or (self._id and not force_insert):
@@ -1,6 +1,14 @@
 import pytest
 from atom.api import Int
-from atomdb.base import Model, ModelManager, ModelSerializer
+import gc
+from atomdb.base import (
+    JSONModel,
+    Model,
+    ModelManager,
+    ModelSerializer,
+    find_subclasses,
+    registered_models,
+)
 
 
 class AbstractModel(Model):
@@ -57,3 +65,39 @@ async def test_model():
     state["removed_field"] = "no-longer-exists"
     state["rating"] = 3.5  # Type changed
     obj = await AbstractModel.restore(state)
+
+
+def test_find_subclasses():
+    class A(AbstractModel):
+        pass
+
+    class B(A):
+        pass
+
+    class C(AbstractModel):
+        pass
+
+    class D(B, C):
+        pass
+
+    # Depth first and classes with multiple bases are only included once
+    assert find_subclasses(AbstractModel) == [A, B, D, C]
+
+
+def test_registered_models():
+    class Point(JSONModel):
+        pass
+
+    # A model of another type with the same name does not replace it
+    class Clash(AbstractModel):
+        __model__ = Point.__model__
+
+    name = Point.__model__
+    assert registered_models(JSONModel)[name] is Point
+    assert registered_models(AbstractModel)[name] is Clash
+    assert JSONModel not in registered_models(JSONModel).values()
+
+    # Models are not kept alive by the registry
+    del Point, Clash
+    gc.collect()
+    assert name not in registered_models(Model)
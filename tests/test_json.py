@@ -3,7 +3,7 @@ import pytest
 import json
 from decimal import Decimal
 from datetime import date, time, datetime
-from atomdb.base import JSONModel
+from atomdb.base import JSONModel, JSONSerializer
 from atom.api import *
 
 
@@ -52,6 +52,19 @@ async def test_json_dates():
     assert r.d == obj.d and r.t == obj.t and r.dt == r.dt
 
 
+@pytest.mark.asyncio
+async def test_json_restore_twice():
+    now = datetime.now()
+    obj = Dates(d=now.date(), t=now.time(), dt=now)
+    state = json.loads(json.dumps(obj.__getstate__()))
+    expected = json.loads(json.dumps(state))
+    r1 = await Dates.restore(state)
+    r2 = await Dates.restore(state)
+    assert state == expected
+    assert r1.d == r2.d == obj.d and r1.t == r2.t == obj.t
+    assert r1.dt == r2.dt == obj.dt
+
+
 @pytest.mark.asyncio
 async def test_json_decimal():
     d = Decimal("3.9")
@@ -110,3 +123,55 @@ async def test_json_cyclical():
     assert r.name == "a"
     assert r.related.name == b.name
     assert r.related.related == r
+
+
+class Folder(JSONModel):
+    name = Str()
+    items = List()
+    parent = ForwardInstance(lambda: Folder)
+
+
+@pytest.mark.asyncio
+async def test_json_nested_containers():
+    root = Folder(name="root")
+    sub = Folder(name="sub", parent=root)
+    now = datetime.now()
+    root.items = [sub, [sub, now.date()], {"files": (b"abc", sub)}]
+
+    state = root.__getstate__()
+    data = json.dumps(state)
+    r = await Folder.restore(json.loads(data))
+    assert r.items[0].name == "sub"
+    assert r.items[0].parent is r
+    assert r.items[1] == [r.items[0], now.date()]
+    assert r.items[2] == {"files": [b"abc", r.items[0]]}
+
+
+def test_json_getstate_scope():
+    obj = Amount(total=Decimal("1.5"))
+    scope = {}
+    obj.__getstate__(scope)
+    assert scope[obj.__ref__] is obj
+
+
+@pytest.mark.asyncio
+async def test_json_restore_many():
+    items = [Amount(total=Decimal(i)) for i in range(3)]
+    states = [json.loads(json.dumps(it.__getstate__())) for it in items]
+    restored = await Amount.restore_many(states)
+    assert [r.total for r in restored] == [it.total for it in items]
+
+
+def test_json_serializer_reassigned():
+    class UpperSerializer(JSONSerializer):
+        def flatten(self, v, scope=None):
+            v = super().flatten(v, scope)
+            return v.upper() if isinstance(v, str) else v
+
+    # The serializer assigned after the class is created is used
+    Options.serializer = UpperSerializer()
+    try:
+        assert Options(b="abc").__getstate__()["b"] == "ABC"
+    finally:
+        del Options.serializer
+    assert Options(b="abc").__getstate__()["b"] == "abc"
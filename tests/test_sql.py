@@ -157,6 +157,26 @@ class Comment(SQLModel):
     when = Instance(time)
 
 
+class Tag(SQLModel):
+    name = Str().tag(length=64)
+
+
+class Article(SQLModel):
+    title = Str().tag(length=64)
+    tags = Relation(lambda: Tag).tag(through=lambda: (ArticleTag, "article", "tag"))
+
+
+class ArticleTag(SQLModel):
+    # Example through table for article tags
+    article = Instance(Article).tag(nullable=False)
+    tag = Instance(Tag).tag(nullable=False)
+
+
+class Node(SQLModel):
+    name = Str().tag(length=64)
+    parent = ForwardInstance(lambda: Node).tag(nullable=True)
+
+
 class Email(SQLModel):
     to = Str().tag(length=120)
     from_ = Str().tag(name="from").tag(length=120)
@@ -168,6 +188,14 @@ def test_build_tables():
     SQLModelManager.instance().create_tables()
 
 
+def test_create_table_copies_columns():
+    t1 = atomdb.sql.create_table(Email, sa.MetaData())
+    t2 = atomdb.sql.create_table(Email, sa.MetaData())
+    assert t1.columns.keys() == t2.columns.keys()
+    assert t1.columns["from"] is not t2.columns["from"]
+    assert t2.columns["from"].table is t2
+
+
 def test_custom_table_name():
     table_name = "some_table.test"
 
@@ -196,6 +224,20 @@ def test_table_subclass():
             db_table = "test_b"
 
 
+def test_model_caches_cleared():
+    # Cached lookups are cleared when a model is created
+    models = atomdb.sql.find_sql_models()
+    atomdb.sql.resolve_member_types(Job.roles)
+    assert atomdb.sql.resolve_member_types.cache_info().currsize
+
+    class Extra(SQLModel):
+        pass
+
+    assert Extra in atomdb.sql.find_sql_models()
+    assert Extra not in models
+    assert atomdb.sql.resolve_member_types.cache_info().currsize == 0
+
+
 async def reset_tables(*models):
     for Model in models:
         try:
@@ -266,10 +308,19 @@ async def db(event_loop):
 def test_query_ops_valid():
     """Test that operators are all valid"""
     from sqlalchemy.sql.expression import ColumnElement
-    from atomdb.sql import QUERY_OPS
+    from atomdb.sql import QUERY_OPS, QUERY_OP_FUNCS
 
     for k, v in QUERY_OPS.items():
         assert hasattr(ColumnElement, v)
+        assert QUERY_OP_FUNCS[k] is getattr(sa.Column, v)
+
+
+@pytest.mark.asyncio
+async def test_query_filter_order(db):
+    """Test that the most selective filter terms are added first"""
+    qs = User.objects.filter(name__startswith="J", age__gt=18, active=True)
+    where = str(qs.query("select")).split("WHERE")[-1]
+    assert where.index("active") < where.index("age") < where.index("name")
 
 
 @pytest.mark.asyncio
@@ -315,6 +366,91 @@ async def test_simple_save_restore_delete(db):
     assert await User.objects.get(name=another_user.name) is not None
 
 
+@pytest.mark.asyncio
+async def test_iterate_break(db):
+    await reset_tables(User)
+    for i in range(3):
+        await User.objects.create(name=faker.name(), email=faker.email(), age=i)
+
+    # The connection is released when stopping early in an async with block
+    engine = User.objects.engine
+    async with User.objects.iterate(batch_size=1) as users:
+        async for user in users:
+            assert engine.freesize == engine.size - 1
+            break
+    assert engine.freesize == engine.size
+
+    # Or when closed
+    users = User.objects.iterate(batch_size=1)
+    async for user in users:
+        break
+    await users.aclose()
+    assert engine.freesize == engine.size
+
+
+@pytest.mark.asyncio
+async def test_save_many(db):
+    await reset_tables(User)
+
+    user = User(name=faker.name(), email=faker.email(), age=20)
+    await user.save()
+    user.age = 21
+
+    users = [User(name=faker.name(), email=faker.email(), age=i) for i in range(5)]
+    users[0].rating = 4.5
+    await User.save_many(users + [user], chunk_size=2)
+
+    assert len(set(u._id for u in users + [user])) == 6
+    for u in users:
+        assert u._id is not None
+        assert u.__restored__
+        assert User.objects.cache.get(u._id) is u
+    assert await User.objects.filter(age=21).count() == 1
+    assert await User.objects.filter(rating=4.5).count() == 1
+    assert await User.objects.count() == 6
+
+
+@pytest.mark.asyncio
+async def test_save_many_unique(db):
+    await reset_tables(Job)
+
+    # Rows are matched to the objects using the unique name
+    jobs = [Job(name=f"job-{i}", duration=timedelta(days=i)) for i in range(5)]
+    await Job.save_many(jobs, chunk_size=3)
+
+    assert len(set(job._id for job in jobs)) == 5
+    table = Job.objects.table
+    for job in jobs:
+        assert Job.objects.cache.get(job._id) is job
+        q = table.select().where(table.c._id == job._id)
+        row = await Job.objects.fetchone(q)
+        assert row["name"] == job.name
+
+
+@pytest.mark.asyncio
+async def test_save_many_references(db):
+    await reset_tables(Node)
+    table = Node.objects.table
+
+    async def saved_parent(node):
+        q = table.select().where(table.c._id == node._id)
+        row = await Node.objects.fetchone(q)
+        return row["parent"]
+
+    # A new object referring to another new object in the same batch
+    a = Node(name="a")
+    b = Node(name="b", parent=a)
+    await Node.save_many([a, b])
+    assert a._id and b._id
+    assert await saved_parent(b) == a._id
+
+    # An existing object referring to a new object earlier in the batch
+    c = Node(name="c")
+    b.parent = c
+    await Node.save_many([c, b])
+    assert await saved_parent(b) == c._id
+
+
 @pytest.mark.asyncio
 async def test_query(db):
     await reset_tables(User)
@@ -428,8 +564,26 @@ async def test_query_limit(db):
 
     assert len(await User.objects.limit(2).all()) == 2
     assert len(await User.objects.offset(2).all()) == 1
+    assert await User.objects.limit(2).count() == 2
+    assert await User.objects.offset(2).count() == 1
+    assert await User.objects.order_by("-age").count() == 3
 
     assert len(await User.objects.filter()[1:2].all()) == 1
+
+    # Iterate in batches
+    ages = [u.age async for u in User.objects.order_by("age").iterate(2)]
+    assert ages == [0, 1, 2]
+
+    # Awaiting the same queryset again reuses the results
+    qs = User.objects.limit(2)
+    users = await qs
+    assert await qs == users
+    assert await qs.all() is not users
+
+    # Changing the results does not change those of the next await
+    users.pop()
+    assert len(await qs) == 2
+
     assert len(await User.objects.filter()[1:].all()) == 2
     assert len(await User.objects.filter()[0].all()) == 1
 
@@ -448,6 +602,14 @@ async def test_query_limit(db):
     with pytest.raises(ValueError):
         User.objects.filter()[0:-1]
 
+    # Writes through the queryset clear the results
+    qs = User.objects.filter(active=True)
+    assert len(await qs) == 3
+    await qs.delete(age=0)
+    assert len(await qs) == 2
+    await qs.update(active=False)
+    assert await qs == []
+
 
 @pytest.mark.asyncio
 async def test_query_select_related(db):
@@ -636,6 +798,27 @@ async def test_transaction_commit(db):
     assert len(await JobRole.objects.all()) == 3
 
 
+@pytest.mark.asyncio
+async def test_session_rollback(db):
+    await reset_tables(Job, JobRole)
+
+    async with SQLModelManager.instance().session() as conn:
+        # Queries made within the session reuse its connection
+        async with Job.objects.connection() as c:
+            assert c is conn
+
+        trans = await conn.begin()
+        job = await Job.objects.create(name=faker.job())
+        await JobRole.objects.create(job=job, name=faker.job())
+        assert len(await JobRole.objects.filter(job=job)) == 1
+        await trans.rollback()
+
+    async with Job.objects.connection() as c:
+        assert c is not conn
+    assert len(await Job.objects.all()) == 0
+    assert len(await JobRole.objects.all()) == 0
+
+
 @pytest.mark.asyncio
 async def test_transaction_delete(db):
     await reset_tables(User)
@@ -753,6 +936,88 @@ async def test_update_renamed(db):
     assert await Page.objects.filter(ranking=3).count() == 2
 
 
+@pytest.mark.asyncio
+async def test_restore_many_through(db):
+    await reset_tables(Tag, Article, ArticleTag)
+
+    tags = [await Tag.objects.create(name=faker.word()) for i in range(3)]
+    articles = [await Article.objects.create(title=faker.bs()) for i in range(3)]
+    for i, article in enumerate(articles):
+        for tag in tags[:i]:
+            await ArticleTag.objects.create(article=article, tag=tag)
+
+    Article.objects.cache.clear()
+    q = Article.objects.table.select(use_labels=True)
+    rows = await Article.objects.fetchall(q)
+
+    # The tags of each article are loaded in bulk
+    restored = await Article.restore_many(rows)
+    assert [a._id for a in restored] == [a._id for a in articles]
+    for i, article in enumerate(restored):
+        assert sorted(t._id for t in article.tags) == [t._id for t in tags[:i]]
+
+    # And also when restored one at a time
+    Article.objects.cache.clear()
+    for i, row in enumerate(rows):
+        article = await Article.restore(row)
+        assert sorted(t._id for t in article.tags) == [t._id for t in tags[:i]]
+
+
+@pytest.mark.asyncio
+async def test_restore_override(db):
+    await reset_tables(Tag)
+    for i in range(3):
+        await Tag.objects.create(name=faker.word())
+
+    restored = []
+
+    async def restore(cls, state, **kwargs):
+        obj = await SQLModel.restore.__func__(cls, state, **kwargs)
+        restored.append(obj)
+        return obj
+
+    # An overridden restore is used for every row
+    Tag.restore = classmethod(restore)
+    try:
+        tags = await Tag.objects.all()
+        assert restored == tags and len(tags) == 3
+        assert [t async for t in Tag.objects.iterate()] == tags
+        assert len(restored) == 6
+    finally:
+        del Tag.restore
+
+
+@pytest.mark.asyncio
+async def test_restorestate_override(db):
+    await reset_tables(Tag, Article, ArticleTag)
+    tag = await Tag.objects.create(name=faker.word())
+    for i in range(3):
+        article = await Article.objects.create(title=faker.bs())
+        await ArticleTag.objects.create(article=article, tag=tag)
+
+    restored = []
+
+    async def __restorestate__(self, state, scope=None):
+        await SQLModel.__restorestate__(self, state, scope)
+        restored.append(self)
+
+    # An overridden __restorestate__ without the prefetched argument works
+    Article.__restorestate__ = __restorestate__
+    try:
+        Article.objects.cache.clear()
+        articles = await Article.objects.all()
+        assert restored == articles and len(articles) == 3
+
+        Article.objects.cache.clear()
+        q = Article.objects.table.select(use_labels=True)
+        articles = await Article.restore_many(await Article.objects.fetchall(q))
+        assert restored[3:] == articles
+        for article in articles:
+            assert [t._id for t in article.tags] == [tag._id]
+    finally:
+        del Article.__restorestate__
+
+
 @pytest.mark.asyncio
 async def test_column_rename(db):
     """Columns can be tagged with custom names. Verify that it works."""
@@ -776,6 +1041,11 @@ async def test_column_rename(db):
     restored = await Email.objects.get(to=e.to)
     restored.from_ == e.from_
 
+    # Updating a renamed column needs to work
+    await Email.objects.filter(to=e.to).update(from_="a@b.com")
+    row = await Email.objects.fetchone(table.select().where(table.c.to == e.to))
+    assert row["from"] == "a@b.com"
+
 
 @pytest.mark.asyncio
 async def test_query_many_to_one(db):
@@ -811,6 +1081,11 @@ async def test_query_many_to_one(db):
         #    assert role.job == job
         loaded.append(job)
 
+    # Restoring the rows in bulk should return the cached objects
+    rows = await JobRole.objects.fetchall(q)
+    roles = await JobRole.restore_many(rows)
+    assert roles == [await JobRole.restore(row) for row in rows]
+
     assert len(await Job.objects.fetchmany(q, size=2)) == 2
 
     # Make sure they pull from cache
@@ -929,6 +1204,24 @@ async def test_object_caching(db):
     assert aref is None, "Cached object was not released"
 
 
+def test_object_cache_size():
+    cache = atomdb.sql.ObjectCache(2)
+    for i in range(3):
+        cache[i] = Email(to=f"{i}")
+    gc.collect()
+
+    # Only the most recent objects are kept
+    assert cache.get(0) is None
+    assert cache.get(1).to == "1"
+    assert cache.get(2).to == "2"
+
+    del cache[1]
+    assert cache.get(1) is None
+    cache.clear()
+    gc.collect()
+    assert cache.get(2) is None
+
+
 def test_invalid_meta_field():
     with pytest.raises(TypeError):
 